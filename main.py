@@ -1,76 +1,126 @@
 import os
-import base64
+import hashlib
+import pybase64
 import streamlit as st
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from python_src.StylistAPIComponent import Gender, StylistAPIComponent
 
 st.set_page_config(page_title="Face-Based Clothes Recommendation", layout="wide")
 
 API_BASE_URL = "http://localhost:9500"  # Adjust if needed
-api = StylistAPIComponent(API_BASE_URL)
+
+# Streamlit re-runs this script on every interaction; caching the component
+# keeps its httpx connection pool alive across reruns and sessions.
+@st.cache_resource
+def get_api() -> StylistAPIComponent:
+    return StylistAPIComponent(API_BASE_URL)
+
+api = get_api()
+MAX_RECOMMENDATIONS = 10
+MAX_UPLOAD_WORKERS = 8
+# Upper bound in seconds on how stale recommendations can get when the
+# catalog is changed outside this app (deletes, store reloads)
+SIMILARITY_CACHE_TTL = 300
+
+# Results are cached by image content and always fetched at the slider's
+# maximum, so re-running with the same face image or a different top_n is
+# answered locally and sliced. This is the only copy of the results; the
+# session just remembers which faces the user asked about.
+@st.cache_data(ttl=SIMILARITY_CACHE_TTL, max_entries=256, show_spinner=False)
+def cached_similarity(image_hash: str, full_resolution: bool, _data: bytes):
+    return api.calculate_similarity_bytes(_data, MAX_RECOMMENDATIONS, full_resolution)
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
 
 def main():
     st.title("Face-Based Clothes Recommendation")
+    full_resolution = st.checkbox("Send full resolution images", value=False)
+
+    # Per-session state survives reruns, so widget changes do not re-send
+    # clothes that were already uploaded or recompute shown recommendations
+    if "uploaded_clothes" not in st.session_state:
+        st.session_state.uploaded_clothes = set()
+    if "shown_faces" not in st.session_state:
+        st.session_state.shown_faces = set()
 
     # Upload Clothes Section
     st.header("Upload Clothes")
     uploaded_clothes = st.file_uploader("Choose clothes images", type=['png', 'jpg', 'jpeg'], accept_multiple_files=True)
     if uploaded_clothes:
+        items = []
         for file in uploaded_clothes:
-            temp_path = f"temp_clothes_{file.name}"
-            with open(temp_path, "wb") as f:
-                f.write(file.getbuffer())
             name = os.path.splitext(file.name)[0]
-            try:
-                api.upload_clothes(name, Gender.MALE, temp_path)
-                st.success(f"Uploaded {name}")
-            except Exception as e:
-                st.error(f"Error uploading {name}: {str(e)}")
-            finally:
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
+            data = file.getvalue()
+            key = (name, content_hash(data))
+            if key not in st.session_state.uploaded_clothes:
+                items.append((key, name, data))
+
+        uploaded_any = False
+        with ThreadPoolExecutor(max_workers=MAX_UPLOAD_WORKERS) as executor:
+            futures = {
+                executor.submit(api.upload_clothes_bytes, name, Gender.MALE, data, full_resolution): (key, name)
+                for key, name, data in items
+            }
+            for future in as_completed(futures):
+                key, name = futures[future]
+                try:
+                    future.result()
+                    st.session_state.uploaded_clothes.add(key)
+                    uploaded_any = True
+                    st.success(f"Uploaded {name}")
+                except Exception as e:
+                    st.error(f"Error uploading {name}: {str(e)}")
+
+        # the catalog changed, so cached recommendations are stale for every session
+        if uploaded_any:
+            cached_similarity.clear()
 
     # Upload Face Image Section
     st.header("Upload Face Image")
     face_file = st.file_uploader("Upload a face image", type=['png', 'jpg', 'jpeg'])
-    top_n = st.slider("Number of items to recommend", 1, 10, 5)
+    top_n = st.slider("Number of items to recommend", 1, MAX_RECOMMENDATIONS, 5)
+
+    face_data = face_file.getvalue() if face_file is not None else None
+    face_key = (content_hash(face_data), full_resolution) if face_data is not None else None
 
     # Compute Similarities Button
     if st.button("Compute Similarities"):
-        if face_file is None:
+        if face_data is None:
             st.error("Please upload a face image first.")
         else:
-            temp_path_face = f"temp_face_{face_file.name}"
-            with open(temp_path_face, "wb") as f:
-                f.write(face_file.getbuffer())
-                
-            st.subheader("Your face image:")
-            st.image(face_file, width=300)
-
-            try:
-                results = api.calculate_similarity(temp_path_face, top_n)
-                st.subheader("Recommended Clothes (ordered by score):")
-                recommended = results.get('data', [])
-                if recommended:
-                    cols = st.columns(3)
-                    for idx, item in enumerate(recommended):
-                        with cols[idx % 3]:
-                            st.write(f"**{item['data_entry']['name']}**")
-                            desc = item.get('data_entry', {}).get('descriptions', [])
-                            st.write("Descriptions: " + ", ".join(desc) if desc else "No description")
-                            st.write(f"Score: {item['score']}")
-                            
-                            image_data = item.get('data_entry', {}).get('image', '')
-                            if image_data:
-                                image_bytes = base64.b64decode(image_data)
-                                st.image(BytesIO(image_bytes), use_column_width=True)
-                else:
-                    st.info("No recommendations found.")
-            except Exception as e:
-                st.error(f"Error finding recommendations: {str(e)}")
-            finally:
-                if os.path.exists(temp_path_face):
-                    os.remove(temp_path_face)
+            st.session_state.shown_faces.add(face_key)
+
+    # Results stay on screen across reruns; top_n only slices the cached
+    # results, which are refetched only after a catalog change or the TTL
+    if face_key in st.session_state.shown_faces:
+        st.subheader("Your face image:")
+        st.image(face_data, width=300)
+
+        try:
+            results = cached_similarity(face_key[0], full_resolution, face_data)
+            st.subheader("Recommended Clothes (ordered by score):")
+            recommended = (results.get('data') or [])[:top_n]
+            if recommended:
+                cols = st.columns(3)
+                for idx, item in enumerate(recommended):
+                    with cols[idx % 3]:
+                        st.write(f"**{item['data_entry']['name']}**")
+                        desc = item.get('data_entry', {}).get('descriptions', [])
+                        st.write("Descriptions: " + ", ".join(desc) if desc else "No description")
+                        st.write(f"Score: {item['score']}")
+                        
+                        image_data = item.get('data_entry', {}).get('image', '')
+                        if image_data:
+                            # st.image takes the decoded bytes as-is; wrapping them in a
+                            # BytesIO only makes Streamlit copy them back out
+                            st.image(pybase64.b64decode(image_data, validate=False), use_column_width=True)
+            else:
+                st.info("No recommendations found.")
+        except Exception as e:
+            # forget the face so a failing server is not retried on every rerun
+            st.session_state.shown_faces.discard(face_key)
+            st.error(f"Error finding recommendations: {str(e)}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
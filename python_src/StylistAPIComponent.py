@@ -1,8 +1,23 @@
-import base64
+import io
+import json
+import mmap
+import os
 from enum import Enum
 from typing import Any, Dict, List
 
 import httpx
+import pybase64
+from PIL import Image, ImageOps
+
+
+# Longest side images are shrunk to before upload, unless full resolution is requested
+PREPROCESS_MAX_SIDE = 768
+PREPROCESS_JPEG_QUALITY = 85
+# Uploads and similarity searches wait on server-side vectorization, which
+# runs one request at a time under the store lock, so queued requests may
+# get no response bytes for a long time. They are not read-limited, since a
+# timed-out upload still completes on the server and a retry duplicates it.
+IMAGE_REQUEST_TIMEOUT = httpx.Timeout(connect=5, read=None, write=300, pool=5)
 
 
 class Gender(str, Enum):
@@ -15,20 +30,83 @@ class StylistAPIComponent:
     
     def __init__(self, base_url: str) -> None:
         self.base_url = base_url
-        self.client = httpx.Client(base_url=base_url, timeout=10000000)
+        self.client = httpx.Client(
+            base_url=base_url,
+            http2=True,
+            timeout=httpx.Timeout(connect=5, read=300, write=300, pool=5),
+            limits=httpx.Limits(max_keepalive_connections=16, max_connections=32, keepalive_expiry=60),
+            headers={"Accept-Encoding": "br, gzip"}
+        )
+
+    def __encode_image(self, image_path: str) -> bytes:
+        # encode straight from a read-only mapping of the file, so the raw
+        # image is never copied into a Python buffer
+        fd = os.open(image_path, os.O_RDONLY)
+        try:
+            # an empty file cannot be mapped
+            if os.fstat(fd).st_size == 0:
+                return b""
+            with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mapped:
+                return pybase64.b64encode(mapped)
+        finally:
+            os.close(fd)
+
+    def _preprocess(self, data: bytes, max_side: int = PREPROCESS_MAX_SIDE, quality: int = PREPROCESS_JPEG_QUALITY) -> bytes:
+        # the embedding side works on small images anyway, so large photos are
+        # downscaled and recompressed to cut the bytes encoded and sent
+        image = Image.open(io.BytesIO(data))
+        if max(image.size) <= max_side:
+            return data
+
+        # apply the EXIF orientation first, since it is not kept on re-save
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        if self._has_transparency(image):
+            # JPEG has no alpha and would turn transparent backgrounds black,
+            # so keep these as PNG, just like the small ones sent untouched
+            image.save(buffer, "PNG", optimize=True)
+        else:
+            image.convert("RGB").save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+        return buffer.getvalue()
+
+    def _has_transparency(self, image: Image.Image) -> bool:
+        return image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
 
-    def __encode_image(self, image_path: str) -> str:
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode()
+    def _encode_bytes(self, data: bytes, full_resolution: bool = False) -> bytes:
+        if not full_resolution:
+            data = self._preprocess(data)
+        return pybase64.b64encode(data)
+
+    def _post_image(self, url: str, fields: Dict[str, Any], image_key: str, image: bytes) -> httpx.Response:
+        # base64 never needs JSON escaping, so the encoded image is spliced
+        # into the body as-is rather than going through json.dumps as a str
+        head = json.dumps(fields).encode()
+        separator = b", " if fields else b""
+        body = b"".join((head[:-1], separator, b'"', image_key.encode(), b'": "', image, b'"}'))
+        return self.client.post(
+            url, content=body, headers={"Content-Type": "application/json"}, timeout=IMAGE_REQUEST_TIMEOUT
+        )
 
     def upload_clothes(self, name: str, gender: Gender, image_path: str) -> Dict[str, Any]:
         payload = {
             "name": name,
-            "gender": gender.value,
-            "image": self.__encode_image(image_path)
+            "gender": gender.value
         }
         
-        response = self.client.post("/api/clothes/upload", json=payload)
+        response = self._post_image("/api/clothes/upload", payload, "image", self.__encode_image(image_path))
+        response.raise_for_status()
+        return response.json()
+
+    def upload_clothes_bytes(
+        self, name: str, gender: Gender, data: bytes, full_resolution: bool = False
+    ) -> Dict[str, Any]:
+        payload = {
+            "name": name,
+            "gender": gender.value
+        }
+        
+        response = self._post_image("/api/clothes/upload", payload, "image", self._encode_bytes(data, full_resolution))
         response.raise_for_status()
         return response.json()
 
@@ -44,11 +122,21 @@ class StylistAPIComponent:
 
     def calculate_similarity(self, image_path: str, top_n: int = 5) -> Dict[str, Any]:
         payload = {
-            "user_image": self.__encode_image(image_path),
             "top_n": top_n
         }
         
-        response = self.client.post("/api/similarity/calculate", json=payload)
+        response = self._post_image("/api/similarity/calculate", payload, "user_image", self.__encode_image(image_path))
+        response.raise_for_status()
+        return response.json()
+
+    def calculate_similarity_bytes(self, data: bytes, top_n: int = 5, full_resolution: bool = False) -> Dict[str, Any]:
+        payload = {
+            "top_n": top_n
+        }
+        
+        response = self._post_image(
+            "/api/similarity/calculate", payload, "user_image", self._encode_bytes(data, full_resolution)
+        )
         response.raise_for_status()
         return response.json()
 
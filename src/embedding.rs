@@ -156,16 +156,34 @@ impl InMemoryVectorStore {
             return Err(DataEntryErrors::NoDataWasFound.into());
         }
 
+        // The query norm is the same for every entry, so compute it only once
+        let query_norm: f64 = self.norm(&query_vector);
+
         // Calculate similarities and store with indices
         let mut similarities: Vec<(usize, f64)> = self
             .data_entries
             .iter()
             .enumerate()
-            .map(|(idx, entry)| (idx, self.cosine_similarity(&query_vector, &entry.vector)))
+            .map(|(idx, entry)| {
+                let score: f64 = self.cosine_similarity(&query_vector, query_norm, &entry.vector);
+                // total_cmp would rank a NaN score above every real one, so
+                // push it to the bottom instead
+                if score.is_nan() {
+                    (idx, f64::NEG_INFINITY)
+                } else {
+                    (idx, score)
+                }
+            })
             .collect();
 
-        // Sort by similarity score in descending order
-        similarities.sort_by(|a, b| b.1.partial_cmp(&a.1).unwrap());
+        // Only the top n entries need to be ordered: move them to the front
+        // in linear time, then sort just those by descending score
+        let descending = |a: &(usize, f64), b: &(usize, f64)| b.1.total_cmp(&a.1);
+        if top_n > 0 && top_n < similarities.len() {
+            similarities.select_nth_unstable_by(top_n - 1, descending);
+        }
+        similarities.truncate(top_n);
+        similarities.sort_by(descending);
 
         // Take top n entries
         let top_entries: Vec<SearchResult> = similarities
@@ -184,11 +202,16 @@ impl InMemoryVectorStore {
         Ok(top_entries)
     }
 
-    // Helper function to calculate cosine similarity between two vectors
-    fn cosine_similarity(&self, a: &[f64], b: &[f64]) -> f64 {
+    // Helper function to calculate the euclidean norm of a vector
+    fn norm(&self, a: &[f64]) -> f64 {
+        a.iter().map(|x| x * x).sum::<f64>().sqrt()
+    }
+
+    // Helper function to calculate cosine similarity between two vectors,
+    // given the precomputed norm of the first one
+    fn cosine_similarity(&self, a: &[f64], norm_a: f64, b: &[f64]) -> f64 {
         let dot_product: f64 = a.iter().zip(b.iter()).map(|(x, y)| x * y).sum();
-        let norm_a: f64 = a.iter().map(|x| x * x).sum::<f64>().sqrt();
-        let norm_b: f64 = b.iter().map(|x| x * x).sum::<f64>().sqrt();
+        let norm_b: f64 = self.norm(b);
 
         if norm_a == 0.0 || norm_b == 0.0 {
             return 0.0;
@@ -309,3 +332,78 @@ impl VectorStore for InMemoryVectorStore {
         Ok(data_entries)
     }
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    // Helper function to create a store holding one entry per vector
+    fn create_store(vectors: Vec<Vec<f64>>) -> InMemoryVectorStore {
+        let mut store: InMemoryVectorStore = InMemoryVectorStore::new(2, vec![], vec![], 2);
+        for (idx, vector) in vectors.into_iter().enumerate() {
+            store
+                .kv_storage(&format!("entry {}", idx), vec![], vector)
+                .unwrap();
+        }
+        store
+    }
+
+    fn result_ids(results: &[SearchResult]) -> Vec<usize> {
+        results.iter().map(|result| result.data_entry.id).collect()
+    }
+
+    #[test]
+    fn test_kv_search_returns_top_n_in_descending_order() {
+        let store: InMemoryVectorStore = create_store(vec![
+            vec![1.0, 0.0],
+            vec![0.0, 1.0],
+            vec![1.0, 1.0],
+            vec![-1.0, 0.0],
+            vec![1.0, 0.1],
+        ]);
+
+        let results: Vec<SearchResult> = store.kv_search(vec![1.0, 0.0], 3).unwrap();
+
+        assert_eq!(result_ids(&results), vec![1, 5, 3]);
+    }
+
+    #[test]
+    fn test_kv_search_matches_full_sort_for_every_top_n() {
+        let vectors: Vec<Vec<f64>> = (0..20)
+            .map(|i| vec![((i * 7) % 11) as f64 - 5.0, ((i * 3) % 13) as f64 - 6.0])
+            .collect();
+        let store: InMemoryVectorStore = create_store(vectors);
+        let query: Vec<f64> = vec![0.3, -0.8];
+
+        let all: Vec<SearchResult> = store.kv_search(query.clone(), 20).unwrap();
+        for pair in all.windows(2) {
+            assert!(pair[0].score >= pair[1].score);
+        }
+
+        for top_n in 1..=25 {
+            let results: Vec<SearchResult> = store.kv_search(query.clone(), top_n).unwrap();
+            let expected: Vec<f64> = all.iter().take(top_n).map(|r| r.score).collect();
+            let scores: Vec<f64> = results.iter().map(|r| r.score).collect();
+            assert_eq!(scores, expected);
+        }
+    }
+
+    #[test]
+    fn test_kv_search_ranks_nan_scores_last() {
+        let store: InMemoryVectorStore =
+            create_store(vec![vec![f64::NAN, 0.0], vec![0.0, 1.0], vec![1.0, 0.0]]);
+
+        let best: Vec<SearchResult> = store.kv_search(vec![1.0, 0.0], 1).unwrap();
+        let all: Vec<SearchResult> = store.kv_search(vec![1.0, 0.0], 3).unwrap();
+
+        assert_eq!(result_ids(&best), vec![3]);
+        assert_eq!(result_ids(&all), vec![3, 2, 1]);
+    }
+
+    #[test]
+    fn test_kv_search_with_zero_top_n_finds_nothing() {
+        let store: InMemoryVectorStore = create_store(vec![vec![1.0, 0.0]]);
+
+        assert!(store.kv_search(vec![1.0, 0.0], 0).is_err());
+    }
+}
@@ -4,7 +4,11 @@ mod store;
 
 use std::{sync::Arc, time::Duration};
 
-use actix_web::{middleware::Logger, web::Data, App, HttpServer};
+use actix_web::{
+    middleware::{Compress, Logger},
+    web::Data,
+    App, HttpServer,
+};
 use anyhow::Error;
 use dim::{self, prompt::load_prompts};
 
@@ -50,6 +54,7 @@ async fn main() -> Result<(), Error> {
     HttpServer::new(move || {
         App::new()
             .wrap(Logger::default())
+            .wrap(Compress::default())
             .app_data(Data::new(shared_store.clone()))
             .configure(routes::config)
     })